@@ -13,31 +13,46 @@
 # - /log-ride -> TEMP DISABLED (kept as stub)
 # - /suggest -> citizen-only suggestions with Up/Down/List Voters buttons and auto thread
 # - NEW: /blacklist -> posts a blacklist announcement embed to BLACKLIST_CHANNEL_ID (role-gated)
-# - Tiny HTTP server for Render health + serving LYFT.png as thumbnail
+# - Tiny raw-asyncio HTTP server for Render health + serving LYFT.png as thumbnail
 
-import os, json, asyncio
-from datetime import datetime, timezone
+import os, json, time, signal, asyncio, hashlib, traceback
+from array import array
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta, timezone
 from typing import Optional, Dict, Any, List, Set
 
 import discord
 from discord import app_commands
-from aiohttp import web
 from dotenv import load_dotenv
 
+try:
+    import uvloop  # faster libuv-based event loop (not available on Windows)
+except ImportError:
+    uvloop = None
+
+try:
+    import orjson  # faster JSON for data.json writes; stdlib json is the fallback
+except ImportError:
+    orjson = None
+
 load_dotenv()
 TOKEN = os.getenv("DISCORD_TOKEN")
 
 # ------------------- CONFIG -------------------
 GUILD_ID = 1416057930381262880
+GUILD_OBJ = discord.Object(id=GUILD_ID)
 
 # Drivers
 ROLE_ID_1 = 1416068902609223749
 ROLE_ID_2 = 1416063969965248594
-DRIVER_ROLES = {ROLE_ID_1, ROLE_ID_2}
+DRIVER_ROLES = frozenset((ROLE_ID_1, ROLE_ID_2))
+DRIVER_PING = f"<@&{ROLE_ID_1}> <@&{ROLE_ID_2}>"
 
 # Reviewers (can approve/deny + use promote/infract)
 REVIEW_ROLE_1 = 1416069791495622707
 REVIEW_ROLE_2 = 1416069983942869113
+REVIEWER_ROLES = frozenset((REVIEW_ROLE_1, REVIEW_ROLE_2))
+REVIEWER_PING = f"<@&{REVIEW_ROLE_1}> <@&{REVIEW_ROLE_2}>"
 
 # Citizen role for /suggest
 CITIZEN_ROLE_ID = 1416066285216727072
@@ -62,6 +77,12 @@ SUGGESTIONS_CHANNEL_ID        = 1417470220276207636  # /suggest
 BLACKLIST_CHANNEL_ID          = 1419171827435049053
 BLACKLISTER_ROLE_ID           = 1416069983942869113  # only this role can use /blacklist
 
+CHANNEL_IDS = (
+    TARGET_CHANNEL_ID, RIDE_LOG_CHANNEL_ID, RATING_LOG_CHANNEL_ID, AUDIT_LOG_CHANNEL_ID,
+    ALLOCATION_CHANNEL_ID, PERMISSION_CHANNEL_ID, PROMOTE_CHANNEL_ID, INFRACT_CHANNEL_ID,
+    INGAME_RIDES_CHANNEL_ID, INGAME_RIDE_LOG_CHANNEL_ID, SUGGESTIONS_CHANNEL_ID, BLACKLIST_CHANNEL_ID,
+)
+
 # Render web server
 PORT = int(os.getenv("PORT", "10000"))
 LOGO_ROUTE = "/logo.png"
@@ -69,295 +90,611 @@ LOGO_URL: Optional[str] = None
 
 SEPARATOR = "▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬"
 
+# Static embed descriptions
+RIDE_REQUEST_DESC = f"L y f t  R i d e  R e q u e s t\n{SEPARATOR}\n-# Use the thread below to coordinate your ride."
+ALLOCATION_DESC   = f"{SEPARATOR}\nA driver has submitted an allocation request for review.\n{SEPARATOR}"
+PERMISSION_DESC   = f"{SEPARATOR}\nA driver has submitted a permission request for approval.\n{SEPARATOR}"
+BLACKLIST_TITLE   = "<:Lyft:1416424004092428370> Lyft Blacklist Announcement <:Lyft:1416424004092428370>"
+PROMOTE_HEADER    = f"Lyft Promotion Log!\n{SEPARATOR}\n\n"
+INFRACT_HEADER    = f"Lyft Infraction Log!\n{SEPARATOR}\n\n"
+
+# Embed colors (built once; discord.Color.xxx() constructs a new object per call)
+COLOR_PREMIUM    = discord.Color.orange()
+COLOR_STANDARD   = discord.Color.blue()
+COLOR_ENDED      = discord.Color.dark_grey()
+COLOR_LOG        = discord.Color.dark_grey()
+COLOR_SUGGESTION = discord.Color.orange()
+
+# Mention rules, built once and passed by reference (never @everyone / reply pings)
+AM_NONE        = discord.AllowedMentions.none()
+AM_USERS       = discord.AllowedMentions(roles=False, users=True, everyone=False, replied_user=False)
+AM_ROLES       = discord.AllowedMentions(roles=True, users=False, everyone=False, replied_user=False)
+
 # ------------------- BOT -------------------
 intents = discord.Intents.default()
-bot = discord.Client(intents=intents)
+
+class LyftBot(discord.Client):
+    db_task: Optional[asyncio.Task] = None
+
+    async def setup_hook(self):
+        # Runs once per process; on_ready fires again on every reconnect/resume.
+        await load_db()
+        self.db_task = asyncio.create_task(db_flusher())
+        self.add_view(SuggestionView())
+        self.add_view(ClaimView())
+        self.add_view(ApproveDenyView())
+        self.add_view(RatingView())
+        # Every command is guild-scoped, so Discord never delivers one from another guild or a DM.
+        tree.add_command(request_group, guild=GUILD_OBJ)
+        tree.add_command(ride_group, guild=GUILD_OBJ)
+        # Sync is heavily rate-limited; only push when the command definitions changed.
+        payload = {"guild": GUILD_ID, "commands": [cmd.to_dict() for cmd in tree.get_commands(guild=GUILD_OBJ)]}
+        commands_hash = hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+        if _db.get("commands_hash") != commands_hash:
+            await tree.sync(guild=GUILD_OBJ)
+            _db["commands_hash"] = commands_hash
+            save_db()
+            print(f"Commands synced to guild {GUILD_ID}")
+        else:
+            print("Commands unchanged; sync skipped")
+
+    async def close(self):
+        await drain_logs()
+        if self.db_task is not None:
+            stop_db_flusher()
+            await self.db_task
+            self.db_task = None
+        await super().close()
+
+bot = LyftBot(intents=intents, allowed_mentions=AM_ROLES)
 tree = app_commands.CommandTree(bot)
 
 # ------------------- UTIL -------------------
 def now_utc():
     return datetime.now(timezone.utc)
 
+# UTC date string, re-formatted only when the day rolls over.
+_day_bucket = -1
+_day_str = ""
+
 def today_iso():
-    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    global _day_bucket, _day_str
+    bucket = int(time.time() // 86400)
+    if bucket != _day_bucket:
+        _day_bucket = bucket
+        _day_str = datetime.fromtimestamp(bucket * 86400, timezone.utc).strftime("%Y-%m-%d")
+    return _day_str
+
+def has_any_role(member: discord.abc.User, role_ids) -> bool:
+    # Member.get_role is a lookup on the member's role-ID list; Member.roles would build
+    # and sort a list of Role objects on every call. Plain Users (DMs) have no roles.
+    get_role = getattr(member, "get_role", None)
+    return get_role is not None and any(get_role(rid) is not None for rid in role_ids)
 
 def has_driver_role(member: discord.abc.User) -> bool:
-    return any(getattr(r, "id", None) in DRIVER_ROLES for r in getattr(member, "roles", []))
+    return has_any_role(member, DRIVER_ROLES)
 
 def is_reviewer(member: discord.abc.User) -> bool:
-    return any(getattr(r, "id", None) in {REVIEW_ROLE_1, REVIEW_ROLE_2} for r in getattr(member, "roles", []))
+    return has_any_role(member, REVIEWER_ROLES)
 
 def has_citizen_role(member: discord.abc.User) -> bool:
-    return any(getattr(r, "id", None) == CITIZEN_ROLE_ID for r in getattr(member, "roles", []))
+    return has_any_role(member, (CITIZEN_ROLE_ID,))
+
+# Strong refs for fire-and-forget tasks (the event loop only keeps weak ones).
+background_tasks: Set[asyncio.Task] = set()
+
+def spawn(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(_background_done)
+    return task
+
+def _background_done(task: asyncio.Task):
+    background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Background task {task.get_coro().__qualname__} failed:")
+        traceback.print_exception(task.exception())
+
+# Click guards keep a finished message's ID only until its edit has certainly landed; after that
+# the message's own embed (Status/title) rejects further clicks.
+GUARD_TTL = 60  # seconds
+
+def release_later(guard: Set[int], message_id: int, delay: float = GUARD_TTL):
+    asyncio.get_running_loop().call_later(delay, guard.discard, message_id)
+
+# Channels resolved once (warmed in on_ready) so hot paths skip get_channel/fetch_channel.
+# None entries are negative-cache hits for channels that don't exist. Forbidden isn't cached,
+# so fixing the bot's permissions takes effect without a restart.
+_MISSING = object()
+channel_cache: Dict[int, Optional[discord.abc.Messageable]] = {}
+
+async def resolve_channel(channel_id: int, cache: bool = True) -> Optional[discord.abc.Messageable]:
+    ch = channel_cache.get(channel_id, _MISSING)
+    if ch is not _MISSING:
+        return ch
+    ch = bot.get_channel(channel_id)
+    if not isinstance(ch, (discord.TextChannel, discord.Thread)):
+        try:
+            ch = await bot.fetch_channel(channel_id)  # type: ignore
+        except discord.NotFound:
+            ch = None
+        except Exception:
+            return None  # forbidden or transient; don't cache
+    if cache:
+        channel_cache[channel_id] = ch
+    return ch
+
+async def warm_channels(*channel_ids: int, attempts: int = 2):
+    for cid in channel_ids:
+        if channel_cache.get(cid, _MISSING) is None:
+            del channel_cache[cid]  # re-check negative entries on every (re)connect
+        for _ in range(attempts):
+            await resolve_channel(cid)
+            if channel_cache.get(cid, _MISSING) is not _MISSING:
+                break  # resolved, or NotFound (negative-cached); only transient failures retry
+            await asyncio.sleep(1)
 
 async def send_embed(
     channel_id: int,
     embed: discord.Embed,
+    *,
     content: Optional[str] = None,
-    allow_roles=False,
-    allow_users=False,
+    allowed: discord.AllowedMentions = AM_NONE,
     view: Optional[discord.ui.View] = None
 ):
-    ch = bot.get_channel(channel_id)
-    if not isinstance(ch, (discord.TextChannel, discord.Thread)):
-        try:
-            ch = await bot.fetch_channel(channel_id)  # type: ignore
-        except Exception:
-            return None
-    return await ch.send(
-        content=content or None,
-        embed=embed,
-        view=view,
-        allowed_mentions=discord.AllowedMentions(
-            roles=allow_roles, users=allow_users, everyone=False, replied_user=False
+    ch = channel_cache.get(channel_id, _MISSING)  # warm hit skips the resolve_channel frame
+    if ch is _MISSING:
+        ch = await resolve_channel(channel_id)
+    if ch is None:
+        return None
+    try:
+        return await ch.send(
+            content=content or None,
+            embed=embed,
+            view=view,
+            allowed_mentions=allowed
         )
+    except discord.NotFound:
+        channel_cache.pop(channel_id, None)  # gone since it was cached; next call re-resolves
+        raise
+
+def patch_embed(
+    base: discord.Embed,
+    fields: Dict[str, str],
+    *,
+    drop: Set[str] = frozenset(),
+    color: Optional[discord.Color] = None,
+    footer: Optional[str] = None,
+    timestamp: Optional[datetime] = None
+) -> discord.Embed:
+    """Patch ``base`` in place and return it: drop fields named in ``drop``, set ``fields`` by
+    name via set_field_at and append any that were missing, in one pass. Names match exactly,
+    since this module writes every field it reads back.
+    Callers pass the interaction's own message embed, which is parsed fresh per interaction."""
+    emb = base
+    emb.timestamp = timestamp or now_utc()
+    if color is not None:
+        emb.color = color
+    if footer is not None:
+        emb.set_footer(text=footer)
+    pending = dict(fields)
+    for i in reversed(range(len(emb.fields))):
+        name = emb.fields[i].name
+        if name in drop:
+            emb.remove_field(i)
+        elif name in pending:
+            emb.set_field_at(i, name=name, value=pending.pop(name), inline=True)
+    for name, value in pending.items():
+        emb.add_field(name=name, value=value, inline=True)
+    return emb
+
+# Static title/color/thumbnail per embed kind, copied per use. Templates carry no fields,
+# so a copy shares nothing that add_field/set_field_at would mutate.
+EMBED_TEMPLATES: Dict[str, discord.Embed] = {}
+
+def build_embed_templates():
+    EMBED_TEMPLATES["promote"] = discord.Embed(color=discord.Color.green())
+    EMBED_TEMPLATES["infract"] = discord.Embed(color=discord.Color.red())
+    EMBED_TEMPLATES["blacklist"] = discord.Embed(title=BLACKLIST_TITLE, color=discord.Color.red())
+    EMBED_TEMPLATES["allocation"] = discord.Embed(
+        title="Allocation Request", description=ALLOCATION_DESC, color=discord.Color.dark_teal()
     )
-
-async def audit(title: str, fields: List[tuple], color: discord.Color = discord.Color.blurple()):
-    emb = discord.Embed(title=title, color=color, timestamp=now_utc())
+    EMBED_TEMPLATES["permission"] = discord.Embed(
+        title="Permission Request", description=PERMISSION_DESC, color=discord.Color.dark_gold()
+    )
+    for level, color in (("Premium", COLOR_PREMIUM), ("Standard", COLOR_STANDARD)):
+        EMBED_TEMPLATES[f"ride_{level}"] = discord.Embed(
+            title=f"{level} Ride Request", description=RIDE_REQUEST_DESC, color=color
+        ).set_footer(text="Click Claim to accept this ride")
+    EMBED_TEMPLATES["ingame"] = discord.Embed(
+        title="In-Game Ride", description="Ride created for a rider outside Discord.", color=discord.Color.teal()
+    )
+    if LOGO_URL:
+        for kind in ("promote", "infract"):
+            EMBED_TEMPLATES[kind].set_thumbnail(url=LOGO_URL)
+
+def template_embed(kind: str, timestamp: datetime, description: Optional[str] = None) -> discord.Embed:
+    emb = EMBED_TEMPLATES[kind].copy()
+    emb.timestamp = timestamp
+    if description is not None:
+        emb.description = description
+    return emb
+
+build_embed_templates()  # rebuilt by start_web_server once LOGO_URL is known
+
+# Fire-and-forget log embeds are queued per channel; one worker per channel posts them
+# in batches of up to 10 embeds per message.
+LOG_BATCH_WINDOW = 0.8  # seconds to collect a burst before posting
+LOG_MAX_EMBEDS = 10     # Discord per-message embed limit
+LOG_MAX_CHARS = 6000    # Discord per-message total embed text limit
+log_queues: Dict[int, "asyncio.Queue[discord.Embed]"] = {}
+log_workers: Dict[int, asyncio.Task] = {}
+_LOG_STOP: Any = object()  # queued by drain_logs; a worker posts what's ahead of it, then exits
+
+def post_log(channel_id: int, embed: discord.Embed):
+    q = log_queues.get(channel_id)
+    if q is None:
+        q = log_queues[channel_id] = asyncio.Queue()
+        log_workers[channel_id] = asyncio.create_task(log_worker(channel_id, q))
+    q.put_nowait(embed)
+
+def audit(title: str, fields: List[tuple], color: discord.Color = discord.Color.blurple(),
+          timestamp: Optional[datetime] = None):
+    # Only queues the entry; the channel's log worker posts it off the handler's path.
+    emb = discord.Embed(title=title, color=color, timestamp=timestamp or now_utc())
     for name, value, inline in fields:
         emb.add_field(name=name, value=value, inline=inline)
-    await send_embed(AUDIT_LOG_CHANNEL_ID, emb)
+    post_log(AUDIT_LOG_CHANNEL_ID, emb)
+
+def _take_log_batch(q: "asyncio.Queue[discord.Embed]", first: discord.Embed) -> tuple:
+    """Drain queued entries behind `first` into one message; returns (batch, carry-over or None)."""
+    batch, size = [first], len(first)
+    while len(batch) < LOG_MAX_EMBEDS and not q.empty():
+        nxt = q.get_nowait()
+        if nxt is _LOG_STOP or size + len(nxt) > LOG_MAX_CHARS:
+            return batch, nxt
+        batch.append(nxt)
+        size += len(nxt)
+    return batch, None
+
+async def _post_log_batch(channel_id: int, batch: List[discord.Embed]):
+    ch = channel_cache.get(channel_id, _MISSING)
+    if ch is _MISSING:
+        ch = await resolve_channel(channel_id)
+    if ch is None:
+        return
+    try:
+        await ch.send(embeds=batch, allowed_mentions=AM_NONE)
+    except discord.NotFound:
+        channel_cache.pop(channel_id, None)
+    except discord.HTTPException:
+        pass
+
+async def log_worker(channel_id: int, q: "asyncio.Queue[discord.Embed]"):
+    carry: Any = None
+    while True:
+        first = carry if carry is not None else await q.get()
+        if first is _LOG_STOP:
+            return
+        await asyncio.sleep(LOG_BATCH_WINDOW)
+        batch, carry = _take_log_batch(q, first)
+        await _post_log_batch(channel_id, batch)
+
+async def drain_logs():
+    for q in log_queues.values():
+        q.put_nowait(_LOG_STOP)
+    await asyncio.gather(*log_workers.values(), return_exceptions=True)
+    log_queues.clear()
+    log_workers.clear()
+
+# ------------------- STORAGE (data.json) -------------------
+# Loaded once in setup_hook; save_db() only marks it dirty and db_flusher writes at most
+# once per DB_FLUSH_DELAY, off the event loop.
+DATA_PATH = os.path.join(os.path.dirname(__file__), "data.json")
+DB_FLUSH_DELAY = 1.0  # seconds; bursts of changes coalesce into one write
+_db: Dict[str, Any] = {}
+_db_dirty = asyncio.Event()
+_db_closing = False
+
+def _read_db() -> Dict[str, Any]:
+    try:
+        with open(DATA_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _write_db(payload: Dict[str, Any]):
+    # Machine-only file: compact output, no indentation.
+    if orjson is not None:
+        data = orjson.dumps(payload)
+    else:
+        data = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    tmp = DATA_PATH + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, DATA_PATH)
+
+async def load_db():
+    global _db
+    _db = await asyncio.to_thread(_read_db)
+    _db.setdefault("riders", {})
+    _db.setdefault("drivers", {})
+    load_votes(_db.setdefault("suggestions", {}))
+
+def save_db():
+    _db_dirty.set()
+
+async def db_flusher():
+    while True:
+        await _db_dirty.wait()
+        if not _db_closing:
+            await asyncio.sleep(DB_FLUSH_DELAY)
+        _db_dirty.clear()
+        _db["suggestions"] = dump_votes()  # snapshot on the loop; the thread only serializes it
+        try:
+            await asyncio.to_thread(_write_db, dict(_db))
+        except OSError as e:
+            print(f"data.json write failed: {e}")
+        if _db_closing and not _db_dirty.is_set():
+            return
+
+def stop_db_flusher():
+    """Make db_flusher write immediately and exit; await its task afterwards."""
+    global _db_closing
+    _db_closing = True
+    _db_dirty.set()
 
 # ------------------- RATINGS (1..5) -------------------
+# Like ClaimView, RatingView is persistent and stateless: rider/driver come from the prompt's
+# fields and the Ride Log message ID from its footer.
+RATING_WINDOW = 600  # seconds a rating prompt accepts clicks
+# Kept for RATING_WINDOW after a rating: a late click still carries the old "Rate Your Driver"
+# payload, and past the window the expiry check rejects it anyway.
+rated_prompts: Set[int] = set()
+
+class RatingButton(discord.ui.Button):
+    def __init__(self, score: int, disabled: bool = False):
+        super().__init__(label=str(score), style=discord.ButtonStyle.secondary, custom_id=f"rate_{score}", disabled=disabled)
+        self.score = score
+
+    async def callback(self, interaction: discord.Interaction):
+        await self.view._submit(interaction, self.score)  # type: ignore[union-attr]
+
 class RatingView(discord.ui.View):
-    def __init__(self, rider_id: int, driver_id: int, log_channel_id: Optional[int], log_message_id: Optional[int]):
-        super().__init__(timeout=600)
-        self.rider_id = rider_id
-        self.driver_id = driver_id
-        self.log_channel_id = log_channel_id
-        self.log_message_id = log_message_id
-        self.submitted = False
+    def __init__(self, disabled: bool = False):
+        super().__init__(timeout=None)
+        for score in range(1, 6):
+            self.add_item(RatingButton(score, disabled))
 
-    async def _update_log_rating(self, score_str: str):
-        if not (self.log_channel_id and self.log_message_id):
+    async def _update_log_rating(self, log_message_id: Optional[int], score_str: str, now: datetime):
+        if not log_message_id:
+            return
+        ch = await resolve_channel(RIDE_LOG_CHANNEL_ID)
+        if ch is None:
             return
-        ch = bot.get_channel(self.log_channel_id)
-        if not isinstance(ch, discord.TextChannel):
-            try:
-                ch = await bot.fetch_channel(self.log_channel_id)  # type: ignore
-            except Exception:
-                return
         try:
-            msg = await ch.fetch_message(self.log_message_id)  # type: ignore
+            msg = await ch.fetch_message(log_message_id)  # type: ignore
         except Exception:
             return
         if not msg.embeds:
             return
-        base = msg.embeds[0]
-        new = discord.Embed(
-            title=base.title, description=base.description,
-            color=discord.Color.green(), timestamp=now_utc()
-        )
-        replaced = False
-        for f in base.fields:
-            if f.name.strip().lower() == "rating":
-                new.add_field(name="Rating", value=score_str, inline=True)
-                replaced = True
-            else:
-                new.add_field(name=f.name, value=f.value, inline=f.inline)
-        if not replaced:
-            new.add_field(name="Rating", value=score_str, inline=True)
-        if base.thumbnail and base.thumbnail.url:
-            new.set_thumbnail(url=base.thumbnail.url)
-        if base.footer and base.footer.text:
-            new.set_footer(text=base.footer.text)
-        await msg.edit(embed=new)
+        await msg.edit(embed=patch_embed(msg.embeds[0], {"Rating": score_str}, color=discord.Color.green(), timestamp=now))
 
     async def _submit(self, interaction: discord.Interaction, score: int):
-        if interaction.user.id != self.rider_id:
+        msg = interaction.message
+        base = msg.embeds[0] if msg and msg.embeds else None
+        if base is None:
+            return await interaction.response.defer()
+        rider_id = mention_id(field_value(base, "Rider"))
+        driver_id = mention_id(field_value(base, "Driver"))
+        if interaction.user.id != rider_id:
             return await interaction.response.send_message("Only the rider can submit this rating.", ephemeral=True)
-        if self.submitted:
+        if msg.id in rated_prompts or base.title != "Rate Your Driver":
             return await interaction.response.send_message("Rating already submitted. Thank you.", ephemeral=True)
+        now = now_utc()
+        if (now - msg.created_at).total_seconds() > RATING_WINDOW:
+            return await interaction.response.send_message("This rating prompt has expired.", ephemeral=True)
+        rated_prompts.add(msg.id)
 
-        self.submitted = True
-        for c in self.children: c.disabled = True
+        footer = base.footer.text if base.footer else None
+        log_message_id = mention_id((footer or "").rsplit(" ", 1)[-1])
 
-        base = interaction.message.embeds[0] if interaction.message and interaction.message.embeds else None
         new = discord.Embed(
             title="Thanks for your feedback!",
             description=f"You rated your driver {score}/5.",
-            color=discord.Color.green(), timestamp=now_utc()
+            color=discord.Color.green(), timestamp=now
         )
-        if base:
-            for f in base.fields:
-                new.add_field(name=f.name, value=f.value, inline=f.inline)
-        await interaction.response.edit_message(embed=new, view=self)
-
-        await self._update_log_rating(f"{score}/5")
-        log = discord.Embed(title="Ride Rating Submitted", color=discord.Color.green(), timestamp=now_utc())
-        log.add_field(name="Rider", value=f"<@{self.rider_id}>", inline=True)
-        log.add_field(name="Driver", value=f"<@{self.driver_id}>", inline=True)
+        for f in base.fields:
+            new.add_field(name=f.name, value=f.value, inline=f.inline)
+        try:
+            await interaction.response.edit_message(embed=new, view=RatingView(disabled=True))
+        except discord.HTTPException:
+            rated_prompts.discard(msg.id)  # let the rider retry
+            raise
+        release_later(rated_prompts, msg.id, RATING_WINDOW)
+
+        await self._update_log_rating(log_message_id, f"{score}/5", now)
+        log = discord.Embed(title="Ride Rating Submitted", color=discord.Color.green(), timestamp=now)
+        log.add_field(name="Rider", value=f"<@{rider_id}>", inline=True)
+        log.add_field(name="Driver", value=f"<@{driver_id}>", inline=True)
         log.add_field(name="Score", value=f"{score}/5", inline=True)
         log.add_field(name="Date", value=today_iso(), inline=True)
-        await send_embed(RATING_LOG_CHANNEL_ID, log)
-
-    @discord.ui.button(label="1", style=discord.ButtonStyle.secondary, custom_id="rate_1")
-    async def b1(self, i: discord.Interaction, _: discord.ui.Button): await self._submit(i, 1)
-    @discord.ui.button(label="2", style=discord.ButtonStyle.secondary, custom_id="rate_2")
-    async def b2(self, i: discord.Interaction, _: discord.ui.Button): await self._submit(i, 2)
-    @discord.ui.button(label="3", style=discord.ButtonStyle.secondary, custom_id="rate_3")
-    async def b3(self, i: discord.Interaction, _: discord.ui.Button): await self._submit(i, 3)
-    @discord.ui.button(label="4", style=discord.ButtonStyle.secondary, custom_id="rate_4")
-    async def b4(self, i: discord.Interaction, _: discord.ui.Button): await self._submit(i, 4)
-    @discord.ui.button(label="5", style=discord.ButtonStyle.secondary, custom_id="rate_5")
-    async def b5(self, i: discord.Interaction, _: discord.ui.Button): await self._submit(i, 5)
+        post_log(RATING_LOG_CHANNEL_ID, log)
 
 # ------------------- REQUEST RIDE VIEW -------------------
+# Ride state lives on the request embed itself ("Requested By" / "Driver" / "Status"),
+# so a single persistent ClaimView can serve every ride message, including after a restart.
+# Message IDs claimed / ended in this process. Each check-and-add below runs with no
+# await in between, so concurrent clicks on one ride cannot both pass without a lock.
+claimed_rides: Set[int] = set()
+ending_rides: Set[int] = set()
+
+def mention_id(value: Optional[str]) -> Optional[int]:
+    digits = (value or "").strip().lstrip("<@!").rstrip(">")
+    return int(digits) if digits.isdigit() else None
+
+CLAIM_DROP_FIELDS = frozenset({"Driver", "Status"})
+
+def field_value(embed: discord.Embed, name: str) -> Optional[str]:
+    for f in embed.fields:
+        if f.name == name:
+            return f.value
+    return None
+
 class ClaimView(discord.ui.View):
-    def __init__(self, requester_id: int, thread_id: Optional[int] = None):
+    def __init__(self, claimed: bool = False, ended: bool = False):
         super().__init__(timeout=None)
-        self.requester_id = requester_id
-        self.thread_id = thread_id
-        self.claimed_by: Optional[int] = None
-        self._lock = asyncio.Lock()
-        self._log_message_id: Optional[int] = None
+        self.claim.disabled = claimed or ended
+        self.end_ride.disabled = ended
 
     @discord.ui.button(label="Claim", style=discord.ButtonStyle.success, custom_id="ride_claim")
     async def claim(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await interaction.response.defer()
-        async with self._lock:
-            if not has_driver_role(interaction.user):
-                return await interaction.followup.send("You are not authorized to claim rides.", ephemeral=True)
-            if self.claimed_by is not None:
-                return await interaction.followup.send("This ride has already been claimed.", ephemeral=True)
-
-            self.claimed_by = interaction.user.id
-            button.disabled = True
+        if not has_driver_role(interaction.user):
+            return await interaction.response.send_message("You are not authorized to claim rides.", ephemeral=True)
+        msg = interaction.message
+        if msg is None or not msg.embeds:
+            return await interaction.response.defer()
+        base = msg.embeds[0]
+        # The embed covers claims from before a restart; the set covers clicks racing this one.
+        if msg.id in claimed_rides or field_value(base, "Driver") is not None:
+            return await interaction.response.send_message("This ride has already been claimed.", ephemeral=True)
+        claimed_rides.add(msg.id)
+        mention = interaction.user.mention
+        now = now_utc()
+        rider_mention = f"<@{mention_id(field_value(base, 'Requested By'))}>"
+
+        new = patch_embed(
+            base, {"Driver": mention, "Status": "🟢 Claimed / Ongoing"},
+            drop=CLAIM_DROP_FIELDS, footer="Ride claimed", timestamp=now
+        )
 
-            msg = interaction.message
-            if msg.embeds:
-                base = msg.embeds[0]
-                new = discord.Embed(
-                    title=base.title, description=base.description,
-                    color=base.color, timestamp=now_utc()
-                )
-                for f in base.fields:
-                    nm = f.name.strip().lower()
-                    if nm in {"driver", "status"}: continue
-                    new.add_field(name=f.name, value=f.value, inline=f.inline)
-                new.add_field(name="Driver", value=interaction.user.mention, inline=True)
-                new.add_field(name="Status", value="🟢 Claimed / Ongoing", inline=True)
-                if base.thumbnail and base.thumbnail.url:
-                    new.set_thumbnail(url=base.thumbnail.url)
-                new.set_footer(text="Ride claimed")
-                await interaction.followup.edit_message(message_id=msg.id, embed=new, view=self)
-
-            assigned = discord.Embed(
-                title="Driver Assigned",
-                description=f"Your driver is {interaction.user.mention}.",
-                color=discord.Color.green(), timestamp=now_utc()
+        assigned = discord.Embed(
+            title="Driver Assigned",
+            description=f"Your driver is {mention}.",
+            color=discord.Color.green(), timestamp=now
+        )
+        assigned.add_field(name="Rider", value=rider_mention, inline=True)
+        assigned.add_field(name="Driver", value=mention, inline=True)
+        try:
+            await asyncio.gather(
+                interaction.response.edit_message(embed=new, view=ClaimView(claimed=True)),
+                send_embed(TARGET_CHANNEL_ID, assigned, content=rider_mention, allowed=AM_USERS),
             )
-            assigned.add_field(name="Rider", value=f"<@{self.requester_id}>", inline=True)
-            assigned.add_field(name="Driver", value=interaction.user.mention, inline=True)
-            await send_embed(TARGET_CHANNEL_ID, assigned, content=f"<@{self.requester_id}>", allow_users=True)
+        except discord.HTTPException:
+            claimed_rides.discard(msg.id)  # let another driver retry; a landed edit still shows the Driver field
+            raise
 
-            await audit("Ride Claimed",
-                        [("Rider", f"<@{self.requester_id}>", True),
-                         ("Driver", interaction.user.mention, True)],
-                        color=discord.Color.orange())
+        audit("Ride Claimed",
+              [("Rider", rider_mention, True),
+               ("Driver", mention, True)],
+              color=discord.Color.orange(), timestamp=now)
 
     @discord.ui.button(label="End Ride", style=discord.ButtonStyle.danger, custom_id="ride_end")
     async def end_ride(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await interaction.response.defer()
-        if self.claimed_by is None:
-            return await interaction.followup.send("This ride has not been claimed yet.", ephemeral=True)
-        if interaction.user.id != self.claimed_by:
-            return await interaction.followup.send("Only the driver who claimed this ride can end it.", ephemeral=True)
-
-        button.disabled = True
-
         msg = interaction.message
-        if msg.embeds:
-            base = msg.embeds[0]
-            new = discord.Embed(
-                title=base.title, description=base.description,
-                color=discord.Color.dark_grey(), timestamp=now_utc()
-            )
-            status_replaced = False
-            for f in base.fields:
-                if f.name.strip().lower() == "status":
-                    new.add_field(name="Status", value="🔴 Completed", inline=True)
-                    status_replaced = True
-                else:
-                    new.add_field(name=f.name, value=f.value, inline=f.inline)
-            if not status_replaced:
-                new.add_field(name="Status", value="🔴 Completed", inline=True)
-            new.set_footer(text="Ride ended")
-            await interaction.followup.edit_message(message_id=msg.id, embed=new, view=self)
-
         orig = msg.embeds[0] if msg and msg.embeds else None
-        pickup = destination = service = "N/A"
-        rider_mention = f"<@{self.requester_id}>"
-        if orig:
-            for f in orig.fields:
-                nm = f.name.strip().lower()
-                if nm == "pickup": pickup = f.value
-                elif nm == "destination": destination = f.value
-                elif nm == "service": service = f.value
+        claimed_by = mention_id(field_value(orig, "Driver")) if orig else None
+        if claimed_by is None:
+            return await interaction.response.send_message("This ride has not been claimed yet.", ephemeral=True)
+        if interaction.user.id != claimed_by:
+            return await interaction.response.send_message("Only the driver who claimed this ride can end it.", ephemeral=True)
+        if msg.id in ending_rides or field_value(orig, "Status") == "🔴 Completed":
+            return await interaction.response.send_message("This ride has already ended.", ephemeral=True)
+        ending_rides.add(msg.id)
+        try:
+            await self._finish_ride(interaction, msg, orig)
+        except Exception:
+            ending_rides.discard(msg.id)  # let the driver retry
+            raise
+        claimed_rides.discard(msg.id)  # ending_rides now guards late clicks with the old payload
+        release_later(ending_rides, msg.id)
+
+    async def _finish_ride(self, interaction: discord.Interaction, msg: discord.Message, orig: discord.Embed):
+        requester_id = mention_id(field_value(orig, "Requested By"))
+        mention = interaction.user.mention
+        now = now_utc()
+        new = patch_embed(orig, {"Status": "🔴 Completed"}, color=COLOR_ENDED, footer="Ride ended", timestamp=now)
+
+        pickup = field_value(orig, "Pickup") or "N/A"
+        destination = field_value(orig, "Destination") or "N/A"
+        service = field_value(orig, "Service") or "N/A"
+        rider_mention = f"<@{requester_id}>"
 
         log_embed = discord.Embed(
             title="Ride Log",
             description="Ride completed and logged automatically.",
-            color=discord.Color.dark_grey(), timestamp=now_utc()
+            color=COLOR_LOG, timestamp=now
         )
         log_embed.add_field(name="Rider", value=rider_mention, inline=True)
-        log_embed.add_field(name="Driver", value=interaction.user.mention, inline=True)
+        log_embed.add_field(name="Driver", value=mention, inline=True)
         log_embed.add_field(name="Pickup", value=pickup, inline=True)
         log_embed.add_field(name="Destination", value=destination, inline=True)
         log_embed.add_field(name="Service", value=service, inline=True)
         log_embed.add_field(name="Rating", value="N/A", inline=True)
         log_embed.set_footer(text=f"Date: {today_iso()}")
 
-        log_msg = await send_embed(
-            RIDE_LOG_CHANNEL_ID, log_embed,
-            content=interaction.user.mention,  # ping DRIVER only
-            allow_users=True
-        )
-        self._log_message_id = getattr(log_msg, "id", None)
-
         done = discord.Embed(
             title="Ride Completed",
-            description=f"Ride ended by {interaction.user.mention}.",
-            color=discord.Color.dark_grey(), timestamp=now_utc()
+            description=f"Ride ended by {mention}.",
+            color=COLOR_ENDED, timestamp=now
         )
         done.add_field(name="Rider", value=rider_mention, inline=True)
-        done.add_field(name="Driver", value=interaction.user.mention, inline=True)
-        await send_embed(TARGET_CHANNEL_ID, done)
-
-        await audit("Ride Ended",
-                    [("Rider", rider_mention, True),
-                     ("Driver", interaction.user.mention, True)],
-                    color=discord.Color.dark_grey())
+        done.add_field(name="Driver", value=mention, inline=True)
+
+        audit("Ride Ended",
+              [("Rider", rider_mention, True),
+               ("Driver", mention, True)],
+              color=COLOR_ENDED, timestamp=now)
+        # Stage A: independent sends in parallel. Stage B (rating prompt) needs the log message ID.
+        _, log_msg, _ = await asyncio.gather(
+            interaction.response.edit_message(embed=new, view=ClaimView(ended=True)),
+            send_embed(
+                RIDE_LOG_CHANNEL_ID, log_embed,
+                content=mention,  # ping DRIVER only
+                allowed=AM_USERS
+            ),
+            send_embed(TARGET_CHANNEL_ID, done),
+        )
 
         rating_embed = discord.Embed(
             title="Rate Your Driver",
             description="How much do you rate your driver?",
-            color=discord.Color.blurple(), timestamp=now_utc()
+            color=discord.Color.blurple(), timestamp=now
         )
+        rating_embed.add_field(name="Rider", value=rider_mention, inline=True)
+        rating_embed.add_field(name="Driver", value=mention, inline=True)
         rating_embed.add_field(name="\u200b", value=SEPARATOR, inline=False)
-        rating_view = RatingView(
-            rider_id=self.requester_id,
-            driver_id=interaction.user.id,
-            log_channel_id=RIDE_LOG_CHANNEL_ID,
-            log_message_id=self._log_message_id
-        )
-
-        thread_chan = None
-        if self.thread_id:
-            thread_chan = bot.get_channel(self.thread_id) or await bot.fetch_channel(self.thread_id)
-        if isinstance(thread_chan, discord.Thread):
+        if log_msg is not None:
+            rating_embed.set_footer(text=f"Ride Log {log_msg.id}")
+        # The ride is already ended and acknowledged; the prompt is a side effect off the click path.
+        spawn(post_rating_prompt(msg.id, rating_embed, rider_mention))
+
+async def post_rating_prompt(ride_message_id: int, rating_embed: discord.Embed, rider_mention: str):
+    rating_view = RatingView()
+    # A thread started from a message shares that message's ID; it is used once, so don't cache it.
+    thread_chan = await resolve_channel(ride_message_id, cache=False)
+    if isinstance(thread_chan, discord.Thread):
+        try:
             await thread_chan.send(
                 content=rider_mention,
                 embed=rating_embed,
                 view=rating_view,
-                allowed_mentions=discord.AllowedMentions(users=True)
-            )
-        else:
-            await send_embed(
-                TARGET_CHANNEL_ID, rating_embed,
-                content=rider_mention, allow_users=True, view=rating_view
+                allowed_mentions=AM_USERS
             )
+            return
+        except discord.HTTPException:
+            pass  # archived/locked thread or no permission there; post in the ride channel instead
+    await send_embed(
+        TARGET_CHANNEL_ID, rating_embed,
+        content=rider_mention, allowed=AM_USERS, view=rating_view
+    )
+
+async def open_ride_thread(msg: discord.Message, name: str):
+    # Failures are non-fatal; the rating prompt falls back to TARGET_CHANNEL_ID.
+    try:
+        await msg.create_thread(name=name, auto_archive_duration=1440)
+    except discord.HTTPException:
+        pass
 
 # ------------------- /request ride -------------------
 request_group = app_commands.Group(name="request", description="Create service requests")
@@ -378,51 +715,41 @@ async def request_ride(
     destination: str,
     service_level: app_commands.Choice[str]
 ):
-    await interaction.response.send_message("Posting your ride...", ephemeral=True)
-    color = discord.Color.orange() if service_level.value == "Premium" else discord.Color.blue()
-    e = discord.Embed(
-        title=f"{service_level.value} Ride Request",
-        description=f"L y f t  R i d e  R e q u e s t\n{SEPARATOR}",
-        color=color, timestamp=now_utc()
-    )
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    user = interaction.user
+    mention = user.mention
+    now = now_utc()
+    color = COLOR_PREMIUM if service_level.value == "Premium" else COLOR_STANDARD
+    e = template_embed(f"ride_{service_level.value}", now)
     e.add_field(name="Pickup", value=starting_location, inline=True)
     e.add_field(name="Destination", value=destination, inline=True)
     e.add_field(name="Service", value=service_level.value, inline=True)
     e.add_field(name="Status", value="🟡 Unclaimed", inline=True)
-    e.add_field(name="Requested By", value=interaction.user.mention, inline=False)
-    e.set_thumbnail(url=interaction.user.display_avatar.url)
-    e.set_footer(text="Click Claim to accept this ride")
+    e.add_field(name="Requested By", value=mention, inline=False)
+    e.set_thumbnail(url=user.display_avatar.url)
 
-    view = ClaimView(requester_id=interaction.user.id)
-
-    ch = bot.get_channel(TARGET_CHANNEL_ID) or await bot.fetch_channel(TARGET_CHANNEL_ID)
-    msg = await ch.send(
-        content=f"<@&{ROLE_ID_1}> <@&{ROLE_ID_2}>",
-        embed=e, view=view,
-        allowed_mentions=discord.AllowedMentions(roles=True)
-    )
+    view = ClaimView()
 
     try:
-        t = await msg.create_thread(name=f"Ride - {interaction.user.display_name}", auto_archive_duration=1440)
-        view.thread_id = t.id
-        intro = discord.Embed(
-            title="Ride Thread",
-            description=f"{interaction.user.mention}\nUse this thread to coordinate your ride.",
-            color=discord.Color.dark_grey()
-        )
-        await t.send(embed=intro)
-    except Exception:
-        pass
+        msg = await send_embed(TARGET_CHANNEL_ID, e, content=DRIVER_PING, allowed=AM_ROLES, view=view)
+    except discord.HTTPException:
+        await interaction.edit_original_response(content="Couldn't post your ride request. Please try again.")
+        raise
+    if msg is None:
+        return await interaction.edit_original_response(content="The ride channel is unavailable right now.")
 
+    # The thread is only needed at End Ride, so the rider isn't kept waiting on it.
+    spawn(open_ride_thread(msg, f"Ride - {user.display_name}"))
     await interaction.edit_original_response(content="Ride posted successfully.")
-    await audit("Ride Requested",
-                [("Rider", interaction.user.mention, True),
-                 ("Pickup", starting_location, True),
-                 ("Destination", destination, True),
-                 ("Service", service_level.value, True)], color=color)
+    audit("Ride Requested",
+          [("Rider", mention, True),
+           ("Pickup", starting_location, True),
+           ("Destination", destination, True),
+           ("Service", service_level.value, True)], color=color, timestamp=now)
 
 # ------------------- /log-ride (disabled) -------------------
 @tree.command(name="log-ride", description="Log a completed ride (temporarily disabled)")
+@app_commands.guilds(GUILD_OBJ)
 async def log_ride_disabled(interaction: discord.Interaction):
     return await interaction.response.send_message(
         "This command is temporarily disabled. Ride logs are posted automatically when the driver ends a ride.",
@@ -430,62 +757,70 @@ async def log_ride_disabled(interaction: discord.Interaction):
     )
 
 # ------------------- Approve / Deny view -------------------
+# Persistent and stateless: kind comes from the embed title ("Allocation Request"),
+# the requester from "Requested By" and the decision state from "Status".
+# Decided IDs stay in the set for GUARD_TTL: a late click still carries the old "🟡 Pending" payload.
+processing_requests: Set[int] = set()
+
 class ApproveDenyView(discord.ui.View):
-    def __init__(self, kind: str, requester_id: int):
+    def __init__(self, finalized: bool = False):
         super().__init__(timeout=None)
-        self.kind = kind
-        self.requester_id = requester_id
-        self.finalized = False
+        for c in self.children: c.disabled = finalized
 
     async def _guard(self, interaction: discord.Interaction) -> bool:
         if not is_reviewer(interaction.user):
             await interaction.response.send_message("You are not allowed to act on this request.", ephemeral=True)
             return False
-        if self.finalized:
+        msg = interaction.message
+        base = msg.embeds[0] if msg and msg.embeds else None
+        if msg.id in processing_requests or (base and field_value(base, "Status") not in (None, "🟡 Pending")):
             await interaction.response.send_message("This request has already been processed.", ephemeral=True)
             return False
+        processing_requests.add(msg.id)
         return True
 
     async def _finish(self, interaction: discord.Interaction, decision: str, symbol: str, color: discord.Color):
-        self.finalized = True
-        for c in self.children: c.disabled = True
-
         msg = interaction.message
-        if msg.embeds:
-            base = msg.embeds[0]
-            new = discord.Embed(
-                title=base.title, description=base.description,
-                color=color, timestamp=now_utc()
-            )
-            had_status = False
-            for f in base.fields:
-                if f.name.strip().lower() == "status":
-                    had_status = True
-                    new.add_field(name="Status", value=f"{symbol} {decision}", inline=True)
-                else:
-                    new.add_field(name=f.name, value=f.value, inline=f.inline)
-            if not had_status:
-                new.add_field(name="Status", value=f"{symbol} {decision}", inline=True)
-            try:
-                await interaction.response.edit_message(embed=new, view=self)
-            except discord.InteractionResponded:
-                await interaction.followup.edit_message(message_id=msg.id, embed=new, view=self)
-
+        try:
+            await self._decide(interaction, msg, decision, symbol, color)
+        except Exception:
+            processing_requests.discard(msg.id)  # let a reviewer retry
+            raise
+        release_later(processing_requests, msg.id)
+
+    async def _decide(self, interaction: discord.Interaction, msg: discord.Message, decision: str, symbol: str, color: discord.Color):
+        base = msg.embeds[0] if msg.embeds else None
+        kind = (base.title or "request").split()[0].lower() if base else "request"
+        requester = f"<@{mention_id(field_value(base, 'Requested By')) if base else None}>"
+        kind_title = f"{kind.capitalize()} Request {decision}"
+        reviewer = interaction.user.mention
+        now = now_utc()
         dec = discord.Embed(
-            title=f"{self.kind.capitalize()} Request {decision}",
-            description=f"{self.kind.capitalize()} request was {decision.lower()} by {interaction.user.mention}.",
-            color=color, timestamp=now_utc()
+            title=kind_title,
+            description=f"{kind.capitalize()} request was {decision.lower()} by {reviewer}.",
+            color=color, timestamp=now
         )
-        dec.add_field(name="Requester", value=f"<@{self.requester_id}>", inline=True)
-        dec.add_field(name="Reviewed By", value=interaction.user.mention, inline=True)
-        await msg.channel.send(
-            content=f"<@{self.requester_id}>",
-            embed=dec,
-            allowed_mentions=discord.AllowedMentions(users=True)
+        dec.add_field(name="Requester", value=requester, inline=True)
+        dec.add_field(name="Reviewed By", value=reviewer, inline=True)
+        audit(kind_title,
+              [("Requester", requester, True),
+               ("Reviewed By", reviewer, True)], color=color, timestamp=now)
+        await asyncio.gather(
+            self._mark_decided(interaction, base, f"{symbol} {decision}", color, now),
+            msg.channel.send(
+                content=requester,
+                embed=dec,
+                allowed_mentions=AM_USERS
+            ),
         )
-        await audit(f"{self.kind.capitalize()} Request {decision}",
-                    [("Requester", f"<@{self.requester_id}>", True),
-                     ("Reviewed By", interaction.user.mention, True)], color=color)
+
+    async def _mark_decided(self, interaction: discord.Interaction, base: Optional[discord.Embed],
+                            status: str, color: discord.Color, now: datetime):
+        if base is None:
+            return await interaction.response.defer()
+        new = patch_embed(base, {"Status": status}, color=color, timestamp=now)
+        # First and only response: _guard answers only when it rejects, and nothing before this awaits.
+        await interaction.response.edit_message(embed=new, view=ApproveDenyView(finalized=True))
 
     @discord.ui.button(label="Accept", style=discord.ButtonStyle.success, custom_id="approve_accept")
     async def approve(self, interaction: discord.Interaction, _: discord.ui.Button):
@@ -499,6 +834,7 @@ class ApproveDenyView(discord.ui.View):
 
 # ------------------- /allocation -------------------
 @tree.command(name="allocation", description="Submit an allocation request")
+@app_commands.guilds(GUILD_OBJ)
 @app_commands.describe(
     role_recipient="User who will receive role changes",
     roles_to_give="Roles to give (names/IDs, comma separated)",
@@ -512,33 +848,34 @@ async def allocation(
     roles_to_remove: str,
     proof: str
 ):
-    if interaction.guild_id != GUILD_ID:
-        return await interaction.response.send_message("This command is not available in this server.", ephemeral=True)
-    if not any(getattr(r, "id", None) == ROLE_ID_1 for r in getattr(interaction.user, "roles", [])):
+    if not has_any_role(interaction.user, (ROLE_ID_1,)):
         return await interaction.response.send_message("You are not authorized to use this command.", ephemeral=True)
 
-    await interaction.response.send_message("Submitting allocation request...", ephemeral=True)
+    await interaction.response.defer(ephemeral=True, thinking=True)
 
-    emb = discord.Embed(
-        title="Allocation Request",
-        description=f"{SEPARATOR}\nA driver has submitted an allocation request for review.\n{SEPARATOR}",
-        color=discord.Color.dark_teal(), timestamp=now_utc()
-    )
+    now = now_utc()
+    emb = template_embed("allocation", now)
     emb.add_field(name="Requested By", value=interaction.user.mention, inline=True)
     emb.add_field(name="Recipient", value=role_recipient.mention, inline=True)
     emb.add_field(name="Roles to Give", value=roles_to_give or "-", inline=False)
     emb.add_field(name="Roles to Remove", value=roles_to_remove or "-", inline=False)
     emb.add_field(name="Proof", value=proof or "-", inline=False)
     emb.add_field(name="Status", value="🟡 Pending", inline=True)
-    emb.add_field(name="Date", value=today_iso(), inline=True)
+    emb.add_field(name="Date", value=now.strftime("%Y-%m-%d"), inline=True)
 
-    content = f"<@&{REVIEW_ROLE_1}> <@&{REVIEW_ROLE_2}>"
-    view = ApproveDenyView(kind="allocation", requester_id=interaction.user.id)
-    await send_embed(ALLOCATION_CHANNEL_ID, emb, content=content, allow_roles=True, view=view)
-    await interaction.followup.send("Allocation request sent.", ephemeral=True)
+    view = ApproveDenyView()
+    try:
+        msg = await send_embed(ALLOCATION_CHANNEL_ID, emb, content=REVIEWER_PING, allowed=AM_ROLES, view=view)
+    except discord.HTTPException:
+        await interaction.edit_original_response(content="Couldn't post the allocation request. Please try again.")
+        raise
+    if msg is None:
+        return await interaction.edit_original_response(content="The allocation channel is unavailable right now.")
+    await interaction.edit_original_response(content="Allocation request sent.")
 
 # ------------------- /permission -------------------
 @tree.command(name="permission", description="Submit a permission request")
+@app_commands.guilds(GUILD_OBJ)
 @app_commands.describe(
     permission="Permission requested",
     duration="Requested duration",
@@ -552,33 +889,42 @@ async def permission(
     reason: str,
     signed: str
 ):
-    if interaction.guild_id != GUILD_ID:
-        return await interaction.response.send_message("This command is not available in this server.", ephemeral=True)
-    if not any(getattr(r, "id", None) == ROLE_ID_1 for r in getattr(interaction.user, "roles", [])):
+    if not has_any_role(interaction.user, (ROLE_ID_1,)):
         return await interaction.response.send_message("You are not authorized to use this command.", ephemeral=True)
 
-    await interaction.response.send_message("Submitting permission request...", ephemeral=True)
+    await interaction.response.defer(ephemeral=True, thinking=True)
 
-    emb = discord.Embed(
-        title="Permission Request",
-        description=f"{SEPARATOR}\nA driver has submitted a permission request for approval.\n{SEPARATOR}",
-        color=discord.Color.dark_gold(), timestamp=now_utc()
-    )
+    now = now_utc()
+    emb = template_embed("permission", now)
     emb.add_field(name="Requested By", value=interaction.user.mention, inline=True)
     emb.add_field(name="Permission", value=permission or "-", inline=False)
     emb.add_field(name="Duration", value=duration or "-", inline=True)
     emb.add_field(name="Reason", value=reason or "-", inline=False)
     emb.add_field(name="Signed", value=signed or "-", inline=True)
     emb.add_field(name="Status", value="🟡 Pending", inline=True)
-    emb.add_field(name="Date", value=today_iso(), inline=True)
+    emb.add_field(name="Date", value=now.strftime("%Y-%m-%d"), inline=True)
 
-    content = f"<@&{REVIEW_ROLE_1}> <@&{REVIEW_ROLE_2}>"
-    view = ApproveDenyView(kind="permission", requester_id=interaction.user.id)
-    await send_embed(PERMISSION_CHANNEL_ID, emb, content=content, allow_roles=True, view=view)
-    await interaction.followup.send("Permission request sent.", ephemeral=True)
+    view = ApproveDenyView()
+    try:
+        msg = await send_embed(PERMISSION_CHANNEL_ID, emb, content=REVIEWER_PING, allowed=AM_ROLES, view=view)
+    except discord.HTTPException:
+        await interaction.edit_original_response(content="Couldn't post the permission request. Please try again.")
+        raise
+    if msg is None:
+        return await interaction.edit_original_response(content="The permission channel is unavailable right now.")
+    await interaction.edit_original_response(content="Permission request sent.")
+
+async def try_dm(user: discord.abc.User, embed: discord.Embed) -> bool:
+    # False only for closed DMs; any other failure propagates to the command.
+    try:
+        await user.send(embed=embed)
+    except discord.Forbidden:
+        return False
+    return True
 
 # ------------------- /promote (reviewers only) -------------------
 @tree.command(name="promote", description="Lyft Promotion record (reviewers only)")
+@app_commands.guilds(GUILD_OBJ)
 @app_commands.describe(
     employee="User being promoted",
     old_rank="Previous rank",
@@ -594,17 +940,13 @@ async def promote(
     reason: str,
     notes: Optional[str] = None
 ):
-    if interaction.guild_id != GUILD_ID:
-        return await interaction.response.send_message("This command is not available in this server.", ephemeral=True)
     if not is_reviewer(interaction.user):
         return await interaction.response.send_message("You are not authorized to use this command.", ephemeral=True)
 
-    await interaction.response.send_message("Promotion logged.", ephemeral=True)
+    await interaction.response.defer(ephemeral=True, thinking=True)
 
     desc = (
-        "Lyft Promotion Log!\n"
-        f"{SEPARATOR}\n\n"
-        f"Employee: {employee.mention}\n\n"
+        f"{PROMOTE_HEADER}Employee: {employee.mention}\n\n"
         f"Old Rank: {old_rank}\n\n"
         f"New Rank: {new_rank}\n"
         f"{SEPARATOR}\n"
@@ -613,15 +955,24 @@ async def promote(
         f"{SEPARATOR}\n"
         f"Processed by: {interaction.user.mention}"
     )
-    emb = discord.Embed(description=desc, color=discord.Color.green(), timestamp=now_utc())
-    if LOGO_URL:
-        emb.set_thumbnail(url=LOGO_URL)
+    now = now_utc()
+    emb = template_embed("promote", now, desc)
 
-    await send_embed(PROMOTE_CHANNEL_ID, emb, content=employee.mention, allow_users=True)
+    # Channel post and DM are independent; only a closed-DMs failure is expected and audited.
     try:
-        await employee.send(embed=emb)
-    except discord.Forbidden:
-        await audit("Promotion DM Failed", [("Employee", employee.mention, True)], color=discord.Color.red())
+        post, delivered = await asyncio.gather(
+            send_embed(PROMOTE_CHANNEL_ID, emb, content=employee.mention, allowed=AM_USERS),
+            try_dm(employee, emb)
+        )
+    except discord.HTTPException:
+        await interaction.edit_original_response(content="Couldn't post the promotion. Please try again.")
+        raise
+    if post is None:
+        await interaction.edit_original_response(content="The promotions channel is unavailable right now; the promotion was not posted.")
+    else:
+        await interaction.edit_original_response(content="Promotion logged.")
+    if not delivered:
+        audit("Promotion DM Failed", [("Employee", employee.mention, True)], color=discord.Color.red(), timestamp=now)
 
 # ------------------- /infract (reviewers only) -------------------
 INFRACTION_CHOICES = [
@@ -635,6 +986,7 @@ INFRACTION_CHOICES = [
 ]
 
 @tree.command(name="infract", description="Lyft Infraction record (reviewers only)")
+@app_commands.guilds(GUILD_OBJ)
 @app_commands.describe(
     employee="User receiving infraction",
     infraction_type="Type of infraction",
@@ -653,18 +1005,14 @@ async def infract(
     notes: Optional[str] = None,
     appealable: Optional[str] = None
 ):
-    if interaction.guild_id != GUILD_ID:
-        return await interaction.response.send_message("This command is not available in this server.", ephemeral=True)
     if not is_reviewer(interaction.user):
         return await interaction.response.send_message("You are not authorized to use this command.", ephemeral=True)
 
-    await interaction.response.send_message("Infraction logged.", ephemeral=True)
+    await interaction.response.defer(ephemeral=True, thinking=True)
 
-    appeal_display = "Yes" if (appealable or "").lower().startswith("y") else "No"
+    appeal_display = "Yes" if appealable and appealable[0] in "yY" else "No"
     desc = (
-        "Lyft Infraction Log!\n"
-        f"{SEPARATOR}\n\n"
-        f"Officer: {interaction.user.mention}\n\n"
+        f"{INFRACT_HEADER}Officer: {interaction.user.mention}\n\n"
         f"Reason: {reason}\n\n"
         f"Infraction Type: {infraction_type.value}\n\n"
         f"Appealable: {appeal_display}\n\n"
@@ -673,99 +1021,86 @@ async def infract(
         f"{SEPARATOR}\n"
         f"Issued to: {employee.mention}"
     )
-    emb = discord.Embed(description=desc, color=discord.Color.red(), timestamp=now_utc())
-    if LOGO_URL:
-        emb.set_thumbnail(url=LOGO_URL)
+    now = now_utc()
+    emb = template_embed("infract", now, desc)
 
-    await send_embed(INFRACT_CHANNEL_ID, emb, content=employee.mention, allow_users=True)
     try:
-        await employee.send(embed=emb)
-    except discord.Forbidden:
-        await audit("Infraction DM Failed", [("Employee", employee.mention, True)], color=discord.Color.red())
+        post, delivered = await asyncio.gather(
+            send_embed(INFRACT_CHANNEL_ID, emb, content=employee.mention, allowed=AM_USERS),
+            try_dm(employee, emb)
+        )
+    except discord.HTTPException:
+        await interaction.edit_original_response(content="Couldn't post the infraction. Please try again.")
+        raise
+    if post is None:
+        await interaction.edit_original_response(content="The infractions channel is unavailable right now; the infraction was not posted.")
+    else:
+        await interaction.edit_original_response(content="Infraction logged.")
+    if not delivered:
+        audit("Infraction DM Failed", [("Employee", employee.mention, True)], color=discord.Color.red(), timestamp=now)
 
 # ------------------- In-Game /ride start -------------------
-ongoing_message_ids: Set[int] = set()
-ongoing_lock = asyncio.Lock()
+# Only "is any other ride still running" is ever asked, so a count is enough. Each ride
+# decrements it once (IngameRideView._ended), and no await splits an update from its check.
+ongoing_rides = 0
+INGAME_LOG_DROP_FIELDS = frozenset({"Status"})
 
 class IngameRideView(discord.ui.View):
-    def __init__(self, driver_id: int, rider_name: str, pickup: str, destination: str, username: str, price_estimate: str, notes: str):
+    def __init__(self, driver_id: int, embed: discord.Embed):
         super().__init__(timeout=None)
         self.driver_id = driver_id
-        self.rider_name = rider_name
-        self.pickup = pickup
-        self.destination = destination
-        self.username = username
-        self.price_estimate = price_estimate
-        self.notes = notes
-        self._lock = asyncio.Lock()
+        self.embed = embed  # the dashboard embed as posted; becomes the log embed at End Ride
+        self._ended = False  # set before the first await so a double click can't log twice
 
     @discord.ui.button(label="End Ride", style=discord.ButtonStyle.danger, custom_id="ingame:end_ride")
     async def end_ride(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await interaction.response.defer()
+        global ongoing_rides
         if interaction.user.id != self.driver_id:
-            return await interaction.followup.send("Only the driver who started this in-game ride can end it.", ephemeral=True)
-
-        async with self._lock:
-            message = interaction.message
-            if message is None:
-                return
-
-            log_channel = interaction.client.get_channel(INGAME_RIDE_LOG_CHANNEL_ID) or await interaction.client.fetch_channel(INGAME_RIDE_LOG_CHANNEL_ID)
-            log_embed = discord.Embed(title="In-Game Ride Log", color=discord.Color.dark_grey(), timestamp=now_utc())
-            log_embed.add_field(name="Driver", value=interaction.user.mention, inline=True)
-            log_embed.add_field(name="Rider Name", value=self.rider_name, inline=True)
-            log_embed.add_field(name="Username", value=self.username, inline=True)
-            log_embed.add_field(name="Pick-Up", value=self.pickup, inline=False)
-            log_embed.add_field(name="Destination", value=self.destination, inline=False)
-            if self.price_estimate:
-                log_embed.add_field(name="Price Estimate", value=self.price_estimate, inline=True)
-            if self.notes:
-                log_embed.add_field(name="Notes", value=self.notes, inline=False)
-            log_embed.set_footer(text=f"Date: {today_iso()}")
-
-            if isinstance(log_channel, (discord.TextChannel, discord.Thread)):
-                await log_channel.send(
-                    content=interaction.user.mention,
-                    embed=log_embed,
-                    allowed_mentions=discord.AllowedMentions(roles=False, users=True, everyone=False, replied_user=False)
-                )
-
-            async with ongoing_lock:
-                ongoing_message_ids.discard(message.id)
-                no_other_ongoing = len(ongoing_message_ids) == 0
-
-            if no_other_ongoing:
-                try:
-                    await message.delete()
-                except discord.HTTPException:
-                    pass
-            else:
-                button.disabled = True
-                if message.embeds:
-                    base = message.embeds[0]
-                    new = discord.Embed(
-                        title=base.title or "In-Game Ride",
-                        description=base.description or "",
-                        color=discord.Color.dark_grey(),
-                        timestamp=now_utc()
-                    )
-                    had_status = False
-                    for f in base.fields:
-                        if f.name.strip().lower() == "status":
-                            had_status = True
-                            new.add_field(name="Status", value="Completed", inline=True)
-                        else:
-                            new.add_field(name=f.name, value=f.value, inline=f.inline)
-                    if not had_status:
-                        new.add_field(name="Status", value="Completed", inline=True)
-                    if base.thumbnail and base.thumbnail.url:
-                        new.set_thumbnail(url=base.thumbnail.url)
-                    if base.footer and base.footer.text:
-                        new.set_footer(text=base.footer.text)
-                    try:
-                        await interaction.followup.edit_message(message_id=message.id, embed=new, view=self)
-                    except discord.HTTPException:
-                        pass
+            return await interaction.response.send_message("Only the driver who started this in-game ride can end it.", ephemeral=True)
+        if self._ended:
+            return await interaction.response.send_message("This in-game ride has already ended.", ephemeral=True)
+        self._ended = True
+        await interaction.response.defer()
+
+        message = interaction.message
+        if message is None:
+            return
+        now = now_utc()
+
+        log_channel = await resolve_channel(INGAME_RIDE_LOG_CHANNEL_ID)
+        # Same fields as the dashboard (Driver is the clicker, checked above) minus Status.
+        log_embed = patch_embed(
+            self.embed, {}, drop=INGAME_LOG_DROP_FIELDS, color=COLOR_LOG,
+            footer=f"Date: {today_iso()}", timestamp=now
+        )
+        log_embed.title = "In-Game Ride Log"
+        log_embed.description = None
+
+        ongoing_rides -= 1
+        no_other_ongoing = ongoing_rides <= 0
+        if not no_other_ongoing:
+            button.disabled = True
+
+        # The log post and the dashboard delete/edit are independent; run them together.
+        jobs = [self._update_dashboard(interaction, message, no_other_ongoing, now)]
+        if log_channel is not None:
+            jobs.append(log_channel.send(
+                content=interaction.user.mention,
+                embed=log_embed,
+                allowed_mentions=AM_USERS
+            ))
+        await asyncio.gather(*jobs)
+
+    async def _update_dashboard(self, interaction: discord.Interaction, message: discord.Message,
+                                remove: bool, now: datetime):
+        try:
+            if remove:
+                await message.delete()
+            elif message.embeds:
+                new = patch_embed(message.embeds[0], {"Status": "Completed"}, color=COLOR_ENDED, timestamp=now)
+                await interaction.followup.edit_message(message_id=message.id, embed=new, view=self)
+        except discord.HTTPException:
+            pass
 
 ride_group = app_commands.Group(name="ride", description="Driver in-game ride actions")
 
@@ -787,18 +1122,13 @@ async def ride_start(
     price_estimate: str = "",
     notes: str = ""
 ):
-    if interaction.guild_id != GUILD_ID:
-        return await interaction.response.send_message("This command isn't available here.", ephemeral=True)
+    global ongoing_rides
     if not has_driver_role(interaction.user):
         return await interaction.response.send_message("Drivers only.", ephemeral=True)
 
     await interaction.response.send_message("In-game ride started.", ephemeral=True)
 
-    emb = discord.Embed(
-        title="In-Game Ride",
-        description="Ride created for a rider outside Discord.",
-        color=discord.Color.teal(), timestamp=now_utc()
-    )
+    emb = template_embed("ingame", now_utc())
     emb.add_field(name="Rider Name", value=rider_name, inline=True)
     emb.add_field(name="Username", value=username, inline=True)
     emb.add_field(name="Status", value="In Progress", inline=True)
@@ -811,61 +1141,99 @@ async def ride_start(
     emb.add_field(name="Driver", value=interaction.user.mention, inline=True)
     emb.set_footer(text=f"Date: {today_iso()}")
 
-    view = IngameRideView(
-        driver_id=interaction.user.id,
-        rider_name=rider_name, pickup=pickup, destination=destination,
-        username=username, price_estimate=price_estimate, notes=notes
-    )
+    view = IngameRideView(driver_id=interaction.user.id, embed=emb)
 
-    channel = bot.get_channel(INGAME_RIDES_CHANNEL_ID) or await bot.fetch_channel(INGAME_RIDES_CHANNEL_ID)
-    msg = await channel.send(
+    msg = await send_embed(
+        INGAME_RIDES_CHANNEL_ID, emb,
         content=interaction.user.mention,  # ping driver at top of dashboard
-        embed=emb, view=view,
-        allowed_mentions=discord.AllowedMentions(roles=False, users=True, everyone=False, replied_user=False)
+        allowed=AM_USERS, view=view
     )
+    if msg is None:
+        return await interaction.followup.send("The in-game rides channel is unavailable right now.", ephemeral=True)
 
-    async with ongoing_lock:
-        ongoing_message_ids.add(msg.id)
+    ongoing_rides += 1
 
 # ------------------- /suggest -------------------
-_votes: Dict[int, Dict[str, Set[int]]]= {}
-_votes_lock = asyncio.Lock()
+# Vote handlers never await while reading or mutating _votes, so it needs no lock.
+# Each record is {"up": array('Q'), "down": array('Q')} of sorted user IDs: 8 bytes per voter
+# instead of a dict entry, bisect for membership, and len() for the button counts.
+# Persisted under data.json "suggestions"; entries older than SUGGESTION_TTL_DAYS are pruned.
+_votes: Dict[int, Dict[str, Any]] = {}
+SUGGESTION_TTL_DAYS = 30
+
+def _new_vote_rec() -> Dict[str, Any]:
+    return {"up": array("Q"), "down": array("Q")}
+
+def _vote_index(ids: array, uid: int) -> int:
+    i = bisect_left(ids, uid)
+    return i if i < len(ids) and ids[i] == uid else -1
+
+def _suggestion_cutoff() -> int:
+    # Snowflakes are time-ordered, so "posted before the cutoff" is an integer compare.
+    return discord.utils.time_snowflake(now_utc() - timedelta(days=SUGGESTION_TTL_DAYS))
+
+def load_votes(stored: Dict[str, Any]):
+    cutoff = _suggestion_cutoff()
+    _votes.clear()
+    for mid, saved in stored.items():
+        if int(mid) < cutoff:
+            continue
+        downs = set(saved.get("down", ()))
+        ups = set(saved.get("up", ())) - downs
+        _votes[int(mid)] = {"up": array("Q", sorted(ups)), "down": array("Q", sorted(downs))}
+
+def dump_votes() -> Dict[str, Any]:
+    cutoff = _suggestion_cutoff()
+    for mid in [m for m in _votes if m < cutoff]:
+        del _votes[mid]
+    return {str(mid): {"up": rec["up"].tolist(), "down": rec["down"].tolist()} for mid, rec in _votes.items()}
 
 def short_preview(text: str, maxlen: int = 40) -> str:
     s = text.strip().replace("\n"," ")
     return (s[:maxlen-1]+"…") if len(s)>maxlen else s
 
+def shown_counts(message: discord.Message) -> tuple:
+    # Read the counts back from the "⬆ n" / "⬇ n" button labels.
+    counts = {"suggest:up": 0, "suggest:down": 0}
+    for row in message.components:
+        for c in getattr(row, "children", ()):
+            label = getattr(c, "label", None) or ""
+            if getattr(c, "custom_id", None) in counts and label[2:].isdigit():
+                counts[c.custom_id] = int(label[2:])
+    return counts["suggest:up"], counts["suggest:down"]
+
 class SuggestionView(discord.ui.View):
-    def __init__(self, message_id: int, up_count: int, down_count: int):
+    # Persistent and stateless like ClaimView: one registered instance serves every suggestion,
+    # keyed by interaction.message.id; a fresh instance is built only to render new counts.
+    def __init__(self, up_count: int = 0, down_count: int = 0, closed: bool = False):
         super().__init__(timeout=None)
-        self.message_id = message_id
         self.up.label = f"⬆ {up_count}"
         self.down.label = f"⬇ {down_count}"
-
-    async def _ensure(self):
-        async with _votes_lock:
-            _votes.setdefault(self.message_id, {"up": set(), "down": set()})
+        for c in self.children: c.disabled = closed
 
     async def _toggle(self, interaction: discord.Interaction, side: str):
-        await self._ensure()
+        if interaction.message.id < _suggestion_cutoff():
+            # Its record has been pruned; freeze the tally the message already shows.
+            await interaction.response.edit_message(view=SuggestionView(*shown_counts(interaction.message), closed=True))
+            return await interaction.followup.send("Voting on this suggestion has closed.", ephemeral=True)
         uid = interaction.user.id
-        async with _votes_lock:
-            rec = _votes[self.message_id]
-            other = "down" if side=="up" else "up"
-            rec[other].discard(uid)
-            if uid in rec[side]:
-                rec[side].remove(uid)
-                action = "removed"
-            else:
-                rec[side].add(uid)
-                action = "added"
-            upc, dnc = len(rec["up"]), len(rec["down"])
-        self.up.label = f"⬆ {upc}"
-        self.down.label = f"⬇ {dnc}"
-        try:
-            await interaction.response.edit_message(view=self)
-        except discord.InteractionResponded:
-            await interaction.followup.edit_message(message_id=interaction.message.id, view=self)
+        rec = _votes.get(interaction.message.id)
+        if rec is None:
+            rec = _votes[interaction.message.id] = _new_vote_rec()
+        mine, other = rec[side], rec["down" if side == "up" else "up"]
+        i = _vote_index(mine, uid)
+        if i >= 0:
+            del mine[i]
+            action = "removed"
+        else:
+            insort(mine, uid)
+            j = _vote_index(other, uid)
+            if j >= 0:
+                del other[j]  # switching sides
+            action = "added"
+        upc, dnc = len(rec["up"]), len(rec["down"])
+        save_db()
+        await interaction.response.edit_message(view=SuggestionView(upc, dnc))
         await interaction.followup.send(f"Vote {action}. (Up: {upc} / Down: {dnc})", ephemeral=True)
 
     @discord.ui.button(label="⬆ 0", style=discord.ButtonStyle.success, custom_id="suggest:up")
@@ -876,57 +1244,56 @@ class SuggestionView(discord.ui.View):
 
     @discord.ui.button(label="List Voters", style=discord.ButtonStyle.secondary, custom_id="suggest:list")
     async def lst(self, i: discord.Interaction, _: discord.ui.Button):
-        await self._ensure()
-        async with _votes_lock:
-            rec = _votes[self.message_id]
-            ups = ", ".join(f"<@{u}>" for u in rec["up"]) or "—"
-            dns = ", ".join(f"<@{u}>" for u in rec["down"]) or "—"
-        e = discord.Embed(title="Suggestion Voters", color=discord.Color.orange(), timestamp=now_utc())
+        if i.message.id < _suggestion_cutoff():
+            return await i.response.send_message("Voting on this suggestion has closed; its voter list is no longer kept.", ephemeral=True)
+        rec = _votes.get(i.message.id)
+        if rec is None:
+            rec = _new_vote_rec()
+        ups = ", ".join(f"<@{uid}>" for uid in rec["up"]) or "—"
+        dns = ", ".join(f"<@{uid}>" for uid in rec["down"]) or "—"
+        e = discord.Embed(title="Suggestion Voters", color=COLOR_SUGGESTION, timestamp=now_utc())
         e.add_field(name="Upvoters", value=ups, inline=False)
         e.add_field(name="Downvoters", value=dns, inline=False)
         await i.response.send_message(embed=e, ephemeral=True)
 
-async def build_suggest_view(mid: int)->SuggestionView:
-    async with _votes_lock:
-        rec = _votes.get(mid, {"up": set(), "down": set()})
-        return SuggestionView(mid, len(rec["up"]), len(rec["down"]))
-
 @tree.command(name="suggest", description="Create a suggestion with voting buttons")
+@app_commands.guilds(GUILD_OBJ)
 @app_commands.describe(suggestion="Your suggestion", notes="Optional notes")
 async def suggest(interaction: discord.Interaction, suggestion: str, notes: Optional[str]=None):
-    if interaction.guild_id != GUILD_ID:
-        return await interaction.response.send_message("This command is not available in this server.", ephemeral=True)
     if not has_citizen_role(interaction.user):
         return await interaction.response.send_message("You need the Los Angeles Citizen role to use this command.", ephemeral=True)
 
     await interaction.response.defer(ephemeral=True)
-    e = discord.Embed(title="New Suggestion", color=discord.Color.orange(), timestamp=now_utc())
+    now = now_utc()
+    e = discord.Embed(title="New Suggestion", color=COLOR_SUGGESTION, timestamp=now)
     e.add_field(name="Suggestion", value=suggestion, inline=False)
     if notes: e.add_field(name="Notes", value=notes, inline=False)
     e.add_field(name="Submitted by", value=interaction.user.mention, inline=False)
 
-    channel = bot.get_channel(SUGGESTIONS_CHANNEL_ID) or await bot.fetch_channel(SUGGESTIONS_CHANNEL_ID)
-    temp_view = SuggestionView(0,0,0)
-    msg = await channel.send(embed=e, view=temp_view)
+    msg = await send_embed(SUGGESTIONS_CHANNEL_ID, e, view=SuggestionView())
+    if msg is None:
+        return await interaction.followup.send("The suggestions channel is unavailable right now.", ephemeral=True)
 
-    async with _votes_lock:
-        _votes[msg.id] = {"up": set(), "down": set()}
-    await msg.edit(view=await build_suggest_view(msg.id))
+    await asyncio.gather(
+        open_suggestion_thread(msg, suggestion, interaction.user.mention, now),
+        interaction.followup.send("Your suggestion has been posted.", ephemeral=True)
+    )
 
+async def open_suggestion_thread(msg: discord.Message, suggestion: str, mention: str, now: datetime):
+    # The thread is a convenience; the suggestion and its votes work without it.
     try:
         thread = await msg.create_thread(name=f"Suggestion – {short_preview(suggestion)}", auto_archive_duration=1440)
         await thread.send(
-            content=interaction.user.mention,
-            embed=discord.Embed(description="Discuss this suggestion here.", color=discord.Color.dark_grey(), timestamp=now_utc()),
-            allowed_mentions=discord.AllowedMentions(users=True)
+            content=mention,
+            embed=discord.Embed(description="Discuss this suggestion here.", color=COLOR_LOG, timestamp=now),
+            allowed_mentions=AM_USERS
         )
     except discord.HTTPException:
         pass
 
-    await interaction.followup.send("Your suggestion has been posted.", ephemeral=True)
-
 # ------------------- /blacklist -------------------
 @tree.command(name="blacklist", description="Post a Lyft Blacklist announcement.")
+@app_commands.guilds(GUILD_OBJ)
 @app_commands.describe(
     citizen="Person being blacklisted (type a name; not a member picker)",
     blacklist="Select the blacklist (Lyft Blacklist)",
@@ -943,89 +1310,127 @@ async def blacklist(
     reason: str,
     duration: str
 ):
-    if interaction.guild_id != GUILD_ID:
-        return await interaction.response.send_message("This command is not available in this server.", ephemeral=True)
-    if not any(getattr(r, "id", None) == BLACKLISTER_ROLE_ID for r in getattr(interaction.user, "roles", [])):
+    if not has_any_role(interaction.user, (BLACKLISTER_ROLE_ID,)):
         return await interaction.response.send_message("You are not authorized to use this command.", ephemeral=True)
 
     await interaction.response.defer(ephemeral=True)
 
-    title = "<:Lyft:1416424004092428370> Lyft Blacklist Announcement <:Lyft:1416424004092428370>"
-    desc_lines = [
-        f"**Citizen:** {citizen}",
-        "",
-        f"**Blacklist:** {blacklist.value}",
-        "",
-        f"**Reason:** {reason}",
-        "",
-        f"**Duration:** `{duration}`",
-        "",
-        f"**Signed:** {interaction.user.mention}",
-    ]
-    emb = discord.Embed(
-        title=title,
-        description="\n".join(desc_lines),
-        color=discord.Color.red(),
-        timestamp=now_utc(),
+    desc = (
+        f"**Citizen:** {citizen}\n\n"
+        f"**Blacklist:** {blacklist.value}\n\n"
+        f"**Reason:** {reason}\n\n"
+        f"**Duration:** `{duration}`\n\n"
+        f"**Signed:** {interaction.user.mention}"
     )
+    emb = template_embed("blacklist", now_utc(), desc)
     await send_embed(BLACKLIST_CHANNEL_ID, emb)
     await interaction.followup.send("Blacklist announcement posted.", ephemeral=True)
 
-# ------------------- READY + SYNC + PERSISTENT ROUTERS -------------------
+# ------------------- READY -------------------
 @bot.event
 async def on_ready():
-    class _SuggestRouter(discord.ui.View):
-        def __init__(self): super().__init__(timeout=None)
-        @discord.ui.button(label="⬆ 0", style=discord.ButtonStyle.success, custom_id="suggest:up")
-        async def r_up(self, i: discord.Interaction, b: discord.ui.Button):
-            v = await build_suggest_view(i.message.id); await v.up.callback(i)  # type: ignore
-        @discord.ui.button(label="⬇ 0", style=discord.ButtonStyle.danger, custom_id="suggest:down")
-        async def r_dn(self, i: discord.Interaction, b: discord.ui.Button):
-            v = await build_suggest_view(i.message.id); await v.down.callback(i)  # type: ignore
-        @discord.ui.button(label="List Voters", style=discord.ButtonStyle.secondary, custom_id="suggest:list")
-        async def r_ls(self, i: discord.Interaction, b: discord.ui.Button):
-            v = await build_suggest_view(i.message.id); await v.lst.callback(i)  # type: ignore
-    bot.add_view(_SuggestRouter())
-
-    guild = discord.Object(id=GUILD_ID)
-    tree.add_command(request_group, guild=guild)
-    tree.add_command(ride_group, guild=guild)
-    tree.copy_global_to(guild=guild)
-    await tree.sync(guild=guild)
-    print(f"Logged in as {bot.user} (ID: {bot.user.id}) — commands synced")
+    await warm_channels(*CHANNEL_IDS)
+    print(f"Logged in as {bot.user} (ID: {bot.user.id})")
+
+@bot.event
+async def on_guild_channel_delete(channel: discord.abc.GuildChannel):
+    channel_cache.pop(channel.id, None)
 
 # ------------------- WEB SERVER (health + serve logo) -------------------
-async def handle_logo(_):
-    path = os.path.join(os.path.dirname(__file__), "LYFT.png")
-    return web.FileResponse(path) if os.path.exists(path) else web.Response(status=404)
+LOGO_PATH = os.path.join(os.path.dirname(__file__), "LYFT.png")
+
+def http_response(status: str, body: bytes = b"", content_type: str = "text/plain", extra_headers: str = "") -> bytes:
+    head = (
+        f"HTTP/1.1 {status}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"{extra_headers}"
+        "Connection: close\r\n\r\n"
+    )
+    return head.encode() + body
 
-async def handle_health(_):
-    return web.Response(text="OK")
+def load_logo() -> Optional[bytes]:
+    try:
+        with open(LOGO_PATH, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+# Read once; Discord's media proxy caches the 200 and can revalidate against the ETag.
+LOGO_BYTES = load_logo()
+LOGO_HASH = hashlib.sha1(LOGO_BYTES).hexdigest() if LOGO_BYTES is not None else ""
+LOGO_ETAG = f'"{LOGO_HASH}"'
+# LOGO_URL carries ?v=<hash>, so a changed logo gets a new URL and the old one can be immutable.
+LOGO_CACHE_HEADERS = f"ETag: {LOGO_ETAG}\r\nCache-Control: public, max-age=31536000, immutable\r\n"
+LOGO_RESPONSE = http_response("200 OK", LOGO_BYTES, "image/png", LOGO_CACHE_HEADERS) if LOGO_BYTES is not None else b""
+LOGO_NOT_MODIFIED = f"HTTP/1.1 304 Not Modified\r\n{LOGO_CACHE_HEADERS}Connection: close\r\n\r\n".encode()
+
+def etag_matches(head: bytes) -> bool:
+    for line in head.split(b"\r\n")[1:]:
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"if-none-match":
+            tags = [t.strip() for t in value.decode("latin-1").split(",")]
+            return "*" in tags or LOGO_ETAG in tags
+    return False
+
+HEALTH_RESPONSE = http_response("200 OK", b"OK")
+NOT_FOUND_RESPONSE = http_response("404 Not Found")
+
+def route_health(head: bytes) -> bytes:
+    return HEALTH_RESPONSE
+
+def route_logo(head: bytes) -> bytes:
+    return LOGO_NOT_MODIFIED if etag_matches(head) else LOGO_RESPONSE
+
+# path -> handler(request head) returning pre-built response bytes
+HTTP_ROUTES = {"/": route_health, "/health": route_health}
+if LOGO_BYTES is not None:
+    HTTP_ROUTES[LOGO_ROUTE] = route_logo
+
+async def handle_http(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=10)
+        method, _, rest = head.partition(b" ")
+        path = rest.split(b" ", 1)[0].split(b"?", 1)[0].decode("latin-1")
+        route = HTTP_ROUTES.get(path)
+        resp = route(head) if route else NOT_FOUND_RESPONSE
+        if method == b"HEAD":
+            resp = resp.split(b"\r\n\r\n", 1)[0] + b"\r\n\r\n"
+        writer.write(resp)
+        await writer.drain()
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
 
 async def start_web_server():
     global LOGO_URL
-    app = web.Application()
-    app.router.add_get(LOGO_ROUTE, handle_logo)
-    app.router.add_get("/", handle_health)
-    app.router.add_get("/health", handle_health)
-    runner = web.AppRunner(app)
-    await runner.setup()
-    site = web.TCPSite(runner, "0.0.0.0", PORT)
-    await site.start()
+    await asyncio.start_server(handle_http, "0.0.0.0", PORT)
     host = os.getenv("RENDER_EXTERNAL_URL")
     if host:
         if not host.startswith("http"): host = "https://" + host
         LOGO_URL = host.rstrip("/") + LOGO_ROUTE
     else:
         LOGO_URL = f"http://localhost:{PORT}{LOGO_ROUTE}"
+    if LOGO_HASH:
+        LOGO_URL += f"?v={LOGO_HASH[:12]}"
+    build_embed_templates()
     print(f"HTTP server listening on 0.0.0.0:{PORT} | LOGO_URL={LOGO_URL}")
 
 # ------------------- MAIN -------------------
 async def main():
     if not TOKEN:
         raise RuntimeError("Missing DISCORD_TOKEN")
-    await start_web_server()
-    await bot.start(TOKEN)
+    # Render stops the service with SIGTERM; closing the bot drains queued logs and flushes data.json.
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: spawn(bot.close()))
+    except NotImplementedError:
+        pass  # Windows has no loop signal handlers
+    # start_web_server returns once listening; bot.start runs until shutdown.
+    # Client.start doesn't close the client when it returns or is cancelled, so `async with` does.
+    async with bot:
+        await asyncio.gather(start_web_server(), bot.start(TOKEN))
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    with asyncio.Runner(loop_factory=uvloop.new_event_loop if uvloop else None) as runner:
+        runner.run(main())